@@ -1,8 +1,15 @@
 # app.py (Version 4.0 - Deterministic Ranking Engine)
 import streamlit as st
-import pandas as pd
-import ast
-import requests
+import numpy as np
+import collections
+import contextlib
+import html
+import os
+import re
+import time
+from config import BUNDLE_DIR, DATA_URL
+from prepare_data import build_lemmas, download_recipes, load_bundle, pack_recipes, save_bundle
+from scoring import common_counts, final_scores, static_scores
 
 # --- CONFIGURATION ---
 st.set_page_config(
@@ -11,67 +18,175 @@ st.set_page_config(
     layout="wide"
 )
 
+# --- PERF INSTRUMENTATION ---
+@contextlib.contextmanager
+def timed(name):
+    """
+    Records the wall time of a block (or, used as a decorator, of every call)
+    in this session's Perf panel: the last 20 timings plus a call count per name.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        st.session_state.setdefault('_timings', collections.deque(maxlen=20)).append((name, elapsed_ms))
+        calls = st.session_state.setdefault('_calls', collections.Counter())
+        calls[name] += 1
+
 # --- LOAD DATA (MODEL IS NO LONGER NEEDED) ---
-@st.cache_data
+@st.cache_resource
+@timed("load_data")  # Inside the cache, so only actual (re)loads are recorded
 def load_data():
-    """Loads the de-duplicated and cleaned recipe dataset from a URL."""
-    # Ensure this URL points to the recipes_cleaned.csv you created with explore_data.py
-    DATA_URL = "https://github.com/StudyBeeTutoring/PantryChef/releases/download/v1.0.0/recipes_cleaned.csv"
-    
-    try:
-        df = pd.read_csv(DATA_URL)
-        df['ingredients_list'] = df['ingredients_list'].apply(ast.literal_eval)
-        return df
-    except Exception as e:
-        st.error(f"Error loading recipe data from URL: {e}")
-        return None
+    """
+    Loads the packed recipe bundle written by prepare_data.py. On a fresh
+    container without one (or with an unreadable one), streams the cleaned
+    CSV and packs it once; the saved bundle then serves as the local cache,
+    skipping the network.
+    Errors propagate, so a failed load isn't cached and the next rerun retries.
+    """
+    data = None
+    if os.path.isdir(BUNDLE_DIR):
+        try:
+            data = load_bundle(BUNDLE_DIR)
+        except (OSError, ValueError):
+            pass  # Incomplete or corrupt bundle: repack and overwrite it below
+    if data is None:
+        data = pack_recipes(download_recipes(DATA_URL))
+        try:
+            save_bundle(data, BUNDLE_DIR)
+        except OSError:
+            pass  # Read-only disk: we simply pack again on the next cold start
+    return data._replace(
+        static_score=static_scores(data.recipe_sizes, data.recipes_df['rating'].to_numpy()),
+        lemmas=build_lemmas(data.vocab),
+    )
 
-recipes_df = load_data()
+try:
+    data = load_data()
+except Exception as e:
+    st.error(f"Error loading recipe data: {e}")
+    data = None
+
+# --- INPUT PARSING ---
+# Pantry items are separated by commas, semicolons or new lines
+_SPLIT_RE = re.compile(r'\s*[,;\n]\s*')
+
+@st.cache_data(max_entries=1024, show_spinner=False)
+def parse_pantry(user_input):
+    """
+    Normalizes the text box contents and validates them against the recipe
+    vocabulary in the same pass: lower-cased, inner whitespace collapsed,
+    empty entries dropped, plural/singular spellings mapped onto the one the
+    recipes use. Returns (number of distinct ingredients entered, sorted
+    tuple of the vocabulary IDs among them); ingredients no recipe uses are
+    dropped here since they could never match anything.
+    Memoized on the raw text, so re-submitting the same pantry skips parsing.
+    """
+    data = load_data()
+    lemmas, vocab = data.lemmas, data.vocab
+    ingredients = set()
+    for item in _SPLIT_RE.split(user_input.lower()):
+        item = ' '.join(item.split())
+        if item:
+            ingredients.add(lemmas.get(item, item))
+    user_ids = sorted(vocab[ing] for ing in ingredients if ing in vocab)
+    return len(ingredients), tuple(user_ids)
 
 # --- THE NEW RANKING ENGINE ---
-def rank_recipes(user_ingredients, recipes_df):
+@timed("rank_recipes")
+def rank_recipes(user_ids, data, top_k=20):
     """
     Ranks recipes based on a deterministic scoring system, not a predictive model.
+    Every recipe's common-ingredient count is computed in one vectorized pass.
+    Returns (number of ranked recipes, top_k recipe indices, their scores).
     """
-    ranked_recipes = []
+    recipe_sizes = data.recipe_sizes
+    common = common_counts(data, user_ids)
     
-    for index, recipe in recipes_df.iterrows():
-        recipe_ingredients = set(recipe['ingredients_list'])
-        common_ingredients = user_ingredients.intersection(recipe_ingredients)
-        missing_ingredients = recipe_ingredients - user_ingredients
-        
-        # --- SCORING LOGIC ---
-        # 1. Primary Score: Heavily reward each matching ingredient.
-        ingredient_match_score = len(common_ingredients) * 20
-        
-        # 2. Penalty Score: Heavily penalize each missing ingredient.
-        # This is the most important rule. A recipe you can't make is a bad match.
-        missing_penalty = len(missing_ingredients) * 50
-        
-        # 3. Bonus for having all ingredients
-        perfect_match_bonus = 50 if len(missing_ingredients) == 0 else 0
-        
-        # 4. Tie-breaker Score: Use rating as a small bonus.
-        # This only matters if two recipes have a similar match score.
-        popularity_bonus = recipe['rating'] * 2
-        
-        # --- FINAL SCORE ---
-        final_score = ingredient_match_score - missing_penalty + perfect_match_bonus + popularity_bonus
-        
-        # We only want to see recipes that have at least some relevance
-        if final_score > 0:
-            ranked_recipes.append({
-                'recipe': recipe,
-                'score': final_score,
-                'missing_count': len(missing_ingredients)
-            })
-
-    # Sort the list of dictionaries by score, descending
-    sorted_recipes = sorted(ranked_recipes, key=lambda x: x['score'], reverse=True)
+    # A recipe sharing nothing with the pantry can never score above zero
+    # (an empty ingredient list is the one trivial perfect match)
+    cand_idx = np.flatnonzero((common > 0) | (recipe_sizes == 0))
+    
+    # --- FINAL SCORE ---
+    # Everything that doesn't depend on the pantry was precomputed at load time
+    final_score = final_scores(common[cand_idx], recipe_sizes[cand_idx], data.static_score[cand_idx])
     
-    return sorted_recipes
+    # We only want to see recipes that have at least some relevance
+    keep = np.flatnonzero(final_score > 0)
+    
+    # Only the top K are ever shown: find the K-th best score in O(n) with
+    # np.partition, then sort just the recipes reaching it by score, descending.
+    # Everything tied with the K-th score takes part, so ties keep dataset order
+    kept_scores = final_score[keep]
+    top = np.arange(len(keep))
+    if len(keep) > top_k:
+        kth = -np.partition(-kept_scores, top_k - 1)[top_k - 1]
+        top = np.flatnonzero(kept_scores >= kth)
+    top = top[np.argsort(-kept_scores[top], kind='stable')][:top_k]
+    
+    top_pos = keep[top]
+    return len(keep), cand_idx[top_pos], final_score[top_pos]
+
+@st.cache_data(ttl=3600, max_entries=256, show_spinner=False)
+def rank(user_ids):
+    """
+    Memoized rank_recipes, keyed on the sorted tuple of pantry ingredient IDs
+    so repeat searches are instant (also when they only differ in spelling
+    or in ingredients no recipe uses). Only small index/score arrays are cached;
+    describe_recipes turns them into display rows after the lookup.
+    The recipe data is fetched from its own cache instead of being passed in,
+    which keeps Streamlit from hashing it on every call.
+    """
+    return rank_recipes(np.array(user_ids, dtype=np.int32), load_data())
+
+def describe_recipes(data, user_ids, top_idx, scores):
+    """
+    Builds the display tuples for ranked recipes: (name, score, sorted missing
+    ingredients, rating, complexity, full ingredient list in the recipe's order)
+    """
+    R, inv_vocab = data.R, data.inv_vocab
+    # A single .iloc for the rows we show, read as plain namedtuples rather than
+    # one pd.Series per row
+    top_rows = data.recipes_df.iloc[top_idx].itertuples(index=False)
+    results = []
+    for i, score, recipe in zip(top_idx, scores, top_rows):
+        # Integer set ops on the recipe's ID row instead of building string sets.
+        # Rows are sorted by ID and IDs follow alphabetical order, so the missing
+        # list comes out sorted without comparing any strings
+        start, end = R.indptr[i], R.indptr[i + 1]
+        row_ids = R.indices[start:end]
+        missing_ids = row_ids[~np.isin(row_ids, user_ids)]
+        results.append((
+            recipe.recipe_name, score, inv_vocab[missing_ids].tolist(),
+            recipe.rating, recipe.recipe_complexity,
+            inv_vocab[data.ingredient_order[start:end]].tolist()
+        ))
+    return results
 
 # --- UI & APP LOGIC ---
+def card_md(name, score, missing_list, rating, complexity, ingredients_list):
+    """
+    Renders one ranked recipe as Markdown: title, score, missing ingredients,
+    and an HTML <details> fold-out with the full ingredient list.
+    """
+    if missing_list:
+        status = f"⚠️ **You might need:** {html.escape(', '.join(missing_list))}"
+    else:
+        status = "✅ You have all the ingredients for this recipe!"
+    ingredients = "\n".join(f"- {html.escape(ing)}" for ing in ingredients_list)
+    return (
+        f"### {html.escape(name)}\n\n"
+        f"**Match Score:** {int(score)} &nbsp;·&nbsp; **Missing Ingredients:** {len(missing_list)}\n\n"
+        f"{status}\n\n"
+        "<details><summary>See full ingredient list and details</summary>\n\n"
+        f"**Popularity Rating:** {rating:.2f} / 5.0\n\n"
+        f"**Complexity:** {complexity} steps\n\n"
+        "**Full Ingredient List:**\n\n"
+        f"{ingredients}\n\n"
+        "</details>"
+    )
+
 st.title("🍳 PantryChef AI")
 st.markdown("Tired of wondering what to cook? **Enter what you have below, separated by commas,** and let our AI find the perfect recipe for you!")
 
@@ -83,47 +198,41 @@ user_input = st.text_area(
 )
 
 if st.button("Find Recipes!", type="primary", use_container_width=True):
-    if recipes_df is None:
+    if data is None:
         st.error("The application's recipe data failed to load. Please refresh.")
     elif not user_input.strip():
         st.warning("Please enter some ingredients to get started.")
     else:
-        user_ingredients = set([item.strip().lower() for item in user_input.split(',')])
-        st.write(f"**Analyzing your {len(user_ingredients)} ingredients...**")
+        n_ingredients, user_ids = parse_pantry(user_input)
+        st.write(f"**Analyzing your {n_ingredients} ingredients...**")
         
         # Use our new ranking engine
-        sorted_recipes = rank_recipes(user_ingredients, recipes_df)
+        with timed("rank"):
+            n_ranked, top_idx, top_scores = rank(user_ids)
         
-        if not sorted_recipes:
+        if n_ranked == 0:
             st.error("Couldn't find any good recipe matches. Try adding more core ingredients.")
         else:
-            st.success(f"🎉 Found and ranked {len(sorted_recipes)} potential recipes! Here are your top 5 recommendations:")
+            st.success(f"🎉 Found and ranked {n_ranked} potential recipes! Here are your top 5 recommendations:")
             
             # --- Display Results ---
-            for result in sorted_recipes[:5]:
-                recipe = result['recipe']
-                score = result['score']
-                missing_count = result['missing_count']
-                
-                missing_ingredients = set(recipe['ingredients_list']) - user_ingredients
-                
-                st.subheader(recipe['recipe_name'])
-                
-                col1, col2 = st.columns([1, 1.5])
-                with col1:
-                    st.metric("Match Score", f"{int(score)}")
-                with col2:
-                    st.metric("Missing Ingredients", f"{missing_count}")
+            # All five cards go out as one Markdown block instead of ~25 separate elements
+            st.markdown(
+                "\n\n---\n\n".join(
+                    card_md(*result)
+                    for result in describe_recipes(data, user_ids, top_idx[:5], top_scores[:5])
+                ),
+                unsafe_allow_html=True
+            )
 
-                if missing_ingredients:
-                    st.warning(f"**You might need:** {', '.join(sorted(list(missing_ingredients)))}")
-                else:
-                    st.success("✅ You have all the ingredients for this recipe!")
-                
-                with st.expander("See full ingredient list and details"):
-                    st.markdown(f"**Popularity Rating:** {recipe['rating']:.2f} / 5.0")
-                    st.markdown(f"**Complexity:** {recipe['recipe_complexity']} steps")
-                    st.markdown("**Full Ingredient List:**")
-                    st.markdown("\n".join(f"- {ing}" for ing in recipe['ingredients_list']))
-                
-                st.divider()
+# --- PERF PANEL ---
+with st.sidebar.expander("⚙️ Perf"):
+    calls = st.session_state.get('_calls', collections.Counter())
+    # rank_recipes only runs when rank() misses its cache
+    st.markdown(
+        f"**Ranking cache:** {calls['rank'] - calls['rank_recipes']} hits / {calls['rank']} searches"
+    )
+    st.markdown("\n".join(
+        f"- `{name}` {elapsed_ms:.1f} ms"
+        for name, elapsed_ms in reversed(st.session_state.get('_timings', []))
+    ) or "_No timings yet._")
@@ -0,0 +1,17 @@
+# config.py - Deployment settings shared by app.py and prepare_data.py
+import os
+from urllib.parse import urlsplit
+
+# Release whose assets we load; override with PANTRYCHEF_VERSION to try another one
+VERSION = os.environ.get("PANTRYCHEF_VERSION", "v1.0.0")
+RELEASE_URL = "https://github.com/StudyBeeTutoring/PantryChef/releases/download/{version}/{asset}"
+
+# The recipes_cleaned.csv created with explore_data.py (a .parquet copy of it,
+# with ingredients_list as a list<string> column, works too)
+DATA_URL = RELEASE_URL.format(version=VERSION, asset="recipes_cleaned.csv")
+
+# Local files: the downloaded dataset, named after the asset so its suffix still
+# picks the right reader, and the packed bundle built from it (one per release,
+# so switching VERSION never loads a stale bundle)
+DATA_PATH = os.path.basename(urlsplit(DATA_URL).path)
+BUNDLE_DIR = f"recipes_packed_{VERSION}"
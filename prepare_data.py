@@ -0,0 +1,272 @@
+# prepare_data.py - Packs the recipe dataset into arrays the app can load without parsing
+"""
+One-time offline step: reads recipes_cleaned.csv (created with explore_data.py)
+or a Parquet copy of it, builds the sparse recipe x ingredient matrix and
+writes it to BUNDLE_DIR.
+
+    python prepare_data.py [path-to-recipes_cleaned.csv-or-.parquet]
+
+app.py memory-maps the bundle on start-up, so the slow ast.literal_eval pass
+over every CSV ingredient list only ever happens here.
+"""
+import io
+import os
+import shutil
+import sys
+import tempfile
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import requests
+import scipy.sparse as sp
+
+from config import BUNDLE_DIR, DATA_PATH, DATA_URL
+
+RECIPE_COLUMNS = ['recipe_name', 'ingredients_list', 'recipe_complexity', 'rating']
+
+
+class RecipeData(NamedTuple):
+    """Everything the ranking engine needs, built once per process."""
+    recipes_df: pd.DataFrame      # recipe_name, rating, recipe_complexity
+    R: sp.csr_matrix              # (n_recipes, n_vocab) 0/1 ingredient matrix
+    vocab: dict                   # ingredient name -> column of R
+    inv_vocab: np.ndarray         # column of R -> ingredient name
+    recipe_sizes: np.ndarray      # number of distinct ingredients per recipe
+    postings_ptr: np.ndarray      # inverted index: the recipes using ingredient j are
+    postings: np.ndarray          # postings[postings_ptr[j]:postings_ptr[j + 1]]
+    ingredient_order: np.ndarray  # R.indices, each row in the recipe's own order
+    static_score: np.ndarray = None  # pantry-independent score, see scoring.static_scores
+    lemmas: dict = None           # plural/singular spelling -> vocab entry, see build_lemmas
+
+
+def fetch(url, path):
+    """
+    Streams url to path in 1 MB chunks (constant memory) and returns path.
+    The ETag is kept next to the file, so an unchanged asset that is already
+    on disk is not downloaded again.
+    """
+    etag_path = path + ".etag"
+    headers = {}
+    if os.path.exists(path) and os.path.exists(etag_path):
+        with open(etag_path) as f:
+            headers['If-None-Match'] = f.read().strip()
+
+    with requests.get(url, headers=headers, stream=True, timeout=30) as r:
+        if r.status_code == 304:
+            return path
+        r.raise_for_status()
+        r.raw.decode_content = True
+        # Write to a side file so an interrupted download never looks complete
+        with open(path + ".part", 'wb') as f:
+            shutil.copyfileobj(r.raw, f, length=1 << 20)
+        etag = r.headers.get('ETag')
+    os.replace(path + ".part", path)
+
+    if etag:
+        with open(etag_path, 'w') as f:
+            f.write(etag)
+    elif os.path.exists(etag_path):
+        os.remove(etag_path)
+    return path
+
+
+def read_recipes_csv(source):
+    """
+    Reads only the columns the app uses, with skinny dtypes, using pyarrow's
+    multi-threaded CSV parser. CSV stores each ingredient list as the text of
+    a Python list, so it has to be parsed back, one cell at a time.
+    """
+    # Only the CSV path needs the Python parser, so only it pays for the import
+    import ast
+
+    df = pd.read_csv(
+        source,
+        usecols=RECIPE_COLUMNS,
+        dtype={'recipe_complexity': 'int16', 'rating': 'float32'},
+        engine='pyarrow',
+    )
+    df['ingredients_list'] = df['ingredients_list'].apply(ast.literal_eval)
+    return df
+
+
+def read_recipes_parquet(source):
+    """
+    Reads the same columns from a Parquet file, where ingredients_list is a
+    native list<string> column: each cell arrives as a NumPy array of strings,
+    without any parsing.
+    """
+    df = pd.read_parquet(source, columns=RECIPE_COLUMNS, engine='pyarrow')
+    return df.astype({'recipe_complexity': 'int16', 'rating': 'float32'})
+
+
+def read_recipes(source):
+    """Reads a local recipes_cleaned .csv or .parquet file."""
+    if str(source).endswith('.parquet'):
+        return read_recipes_parquet(source)
+    return read_recipes_csv(source)
+
+
+def download_recipes(url):
+    """
+    Reads the dataset straight from its URL. A CSV is parsed off the HTTP
+    response as it streams in, so parsing overlaps the download and the raw
+    bytes never have to sit in memory all at once. Parquet keeps its index
+    at the end of the file, so it is downloaded whole first.
+    """
+    with requests.get(url, stream=True, timeout=30) as r:
+        r.raise_for_status()
+        r.raw.decode_content = True
+        if url.endswith('.parquet'):
+            return read_recipes_parquet(io.BytesIO(r.content))
+        return read_recipes_csv(r.raw)
+
+
+def build_ingredient_matrix(ingredient_lists):
+    """
+    Encodes every recipe's ingredients as one row of a sparse 0/1 matrix.
+    Returns (R, vocab, recipe_sizes, ingredient_order) where R has shape
+    (n_recipes, n_vocab) and ingredient_order holds the same IDs as
+    R.indices, but in the order the recipe lists them.
+    """
+    # Sorted, interned vocabulary: IDs follow alphabetical order and every
+    # ingredient string exists once in memory
+    all_ingredients = set().union(*ingredient_lists)
+    vocab = {sys.intern(ing): i for i, ing in enumerate(sorted(all_ingredients))}
+
+    indices = []
+    indptr = [0]
+    for ingredients in ingredient_lists:
+        # A recipe listing the same ingredient twice must still count it once
+        indices.extend(dict.fromkeys(vocab[ing] for ing in ingredients))
+        indptr.append(len(indices))
+
+    indices = np.asarray(indices, dtype=np.int32)
+    indptr = np.asarray(indptr, dtype=np.int32)
+    # Copied before sort_indices, which sorts R's rows in place
+    ingredient_order = indices.copy()
+    data = np.ones(len(indices), dtype=np.float32)
+    R = sp.csr_matrix((data, indices, indptr), shape=(len(indptr) - 1, len(vocab)))
+    R.sort_indices()
+    recipe_sizes = np.diff(indptr)
+    return R, vocab, recipe_sizes, ingredient_order
+
+
+def pack_recipes(df):
+    """Builds a RecipeData from the dataset as returned by read_recipes."""
+    R, vocab, recipe_sizes, ingredient_order = build_ingredient_matrix(df['ingredients_list'])
+    inv_vocab = np.array(list(vocab))
+    recipes_df = df[['recipe_name', 'rating', 'recipe_complexity']].reset_index(drop=True)
+    # The column-major form of R is exactly the ingredient -> recipes index
+    R_csc = R.tocsc()
+    return RecipeData(
+        recipes_df, R, vocab, inv_vocab, recipe_sizes, R_csc.indptr, R_csc.indices, ingredient_order
+    )
+
+
+def save_bundle(data, bundle_dir=BUNDLE_DIR):
+    """
+    Writes a RecipeData as plain .npy files (no pickles), one per array.
+    They go to a temporary sibling directory that is only renamed to
+    bundle_dir once complete, so an interrupted save never leaves a partial
+    bundle behind.
+    """
+    bundle_dir = os.path.abspath(bundle_dir)
+    tmp_dir = tempfile.mkdtemp(prefix=os.path.basename(bundle_dir) + ".", dir=os.path.dirname(bundle_dir))
+    try:
+        _write_bundle(data, tmp_dir)
+        # A rename can't replace a non-empty directory, e.g. a broken bundle
+        shutil.rmtree(bundle_dir, ignore_errors=True)
+        os.replace(tmp_dir, bundle_dir)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+
+def _write_bundle(data, bundle_dir):
+    np.save(os.path.join(bundle_dir, "indptr.npy"), data.R.indptr)
+    np.save(os.path.join(bundle_dir, "indices.npy"), data.R.indices)
+    np.save(os.path.join(bundle_dir, "postings_ptr.npy"), data.postings_ptr)
+    np.save(os.path.join(bundle_dir, "postings.npy"), data.postings)
+    np.save(os.path.join(bundle_dir, "ingredient_order.npy"), data.ingredient_order)
+    np.save(os.path.join(bundle_dir, "vocab.npy"), data.inv_vocab)
+    # Names as one UTF-8 byte string plus offsets: a fixed-width '<U' array would
+    # pad every name to the longest one, at 4 bytes per character
+    encoded = [name.encode() for name in data.recipes_df['recipe_name'].astype(str)]
+    names_ptr = np.zeros(len(encoded) + 1, dtype=np.int64)
+    names_ptr[1:] = np.cumsum(np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded)))
+    np.save(os.path.join(bundle_dir, "names.npy"), np.frombuffer(b''.join(encoded), dtype=np.uint8))
+    np.save(os.path.join(bundle_dir, "names_ptr.npy"), names_ptr)
+    # Skinny dtypes: a rating doesn't need float64, nor a step count int64
+    np.save(os.path.join(bundle_dir, "rating.npy"), data.recipes_df['rating'].to_numpy(dtype=np.float32))
+    np.save(
+        os.path.join(bundle_dir, "complexity.npy"),
+        pd.to_numeric(data.recipes_df['recipe_complexity'], downcast='integer').to_numpy()
+    )
+
+
+def load_bundle(bundle_dir=BUNDLE_DIR):
+    """Loads a bundle written by save_bundle, memory-mapping all but the vocabulary."""
+    def load(name, mmap_mode='r'):
+        return np.load(os.path.join(bundle_dir, name), mmap_mode=mmap_mode)
+
+    indptr = load("indptr.npy")
+    indices = load("indices.npy")
+    inv_vocab = load("vocab.npy", mmap_mode=None)
+    # An Arrow string column viewing the mapped names, so only the rows that
+    # get displayed are ever decoded
+    names_ptr = load("names_ptr.npy")
+    names = pa.LargeStringArray.from_buffers(
+        len(names_ptr) - 1, pa.py_buffer(names_ptr), pa.py_buffer(load("names.npy"))
+    )
+    recipes_df = pd.DataFrame({
+        'recipe_name': pd.arrays.ArrowExtensionArray(names),
+        'rating': load("rating.npy"),
+        'recipe_complexity': load("complexity.npy"),
+    }, copy=False)
+
+    data = np.ones(len(indices), dtype=np.float32)
+    R = sp.csr_matrix((data, indices, indptr), shape=(len(indptr) - 1, len(inv_vocab)), copy=False)
+    # save_bundle wrote canonical (sorted) rows; the mmap is read-only anyway
+    R.has_sorted_indices = True
+    vocab = {sys.intern(ing): i for i, ing in enumerate(inv_vocab.tolist())}
+    recipe_sizes = np.diff(indptr)
+    return RecipeData(
+        recipes_df, R, vocab, inv_vocab, recipe_sizes, load("postings_ptr.npy"), load("postings.npy"),
+        load("ingredient_order.npy")
+    )
+
+
+def build_lemmas(vocab):
+    """
+    Mines the vocabulary for singular/plural spellings it doesn't contain
+    ("onions" when only "onion" exists, or the other way round) and maps each
+    one to the spelling it does contain, so user input matches either way.
+    """
+    lemmas = {}
+    for ing in vocab:
+        if ing.endswith('ss'):                  # glass -> glasses
+            variants = [ing + 'es']
+        elif ing.endswith('ies'):               # berries -> berry
+            variants = [ing[:-3] + 'y']
+        elif ing.endswith('es'):                # tomatoes -> tomato, olives -> olive
+            variants = [ing[:-2], ing[:-1]]
+        elif ing.endswith('s'):                 # eggs -> egg
+            variants = [ing[:-1]]
+        elif ing.endswith('y'):                 # cherry -> cherries
+            variants = [ing[:-1] + 'ies', ing + 's']
+        else:                                   # onion -> onions, potato -> potatoes
+            variants = [ing + 's', ing + 'es']
+        for variant in variants:
+            if variant and variant not in vocab:
+                lemmas.setdefault(variant, ing)
+    return lemmas
+
+
+if __name__ == "__main__":
+    source = sys.argv[1] if len(sys.argv) > 1 else fetch(DATA_URL, DATA_PATH)
+    print(f"Reading {source} ...")
+    data = pack_recipes(read_recipes(source))
+    save_bundle(data)
+    print(f"Packed {data.R.shape[0]} recipes and {len(data.vocab)} ingredients into {BUNDLE_DIR}/")
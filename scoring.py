@@ -0,0 +1,61 @@
+# scoring.py - Counting and scoring for the ranking engine
+"""
+Counts, for every recipe at once, how many of the user's ingredients it uses,
+and turns those counts into ranking scores.
+
+Counting goes through the inverted index, which only touches recipes using
+one of the user's ingredients.
+
+Kept out of app.py on purpose: Streamlit re-executes app.py on every click,
+while an imported module is only set up once per process.
+"""
+import numpy as np
+
+# --- SCORING LOGIC ---
+# Each recipe is described by four features, and its score is their weighted sum:
+# 1. Primary Score: Heavily reward each matching ingredient.
+# 2. Penalty Score: Heavily penalize each missing ingredient.
+#    This is the most important rule. A recipe you can't make is a bad match.
+# 3. Bonus for having all ingredients
+# 4. Tie-breaker Score: Use rating as a small bonus.
+#    This only matters if two recipes have a similar match score.
+SCORE_WEIGHTS = np.array([20, -50, 50, 2], dtype=np.float32)
+
+
+def common_counts(data, user_ids):
+    """
+    Returns an int32 array with the number of user ingredients in each recipe
+    of a prepare_data.RecipeData, given the user's distinct vocabulary IDs.
+    Concatenates the posting lists of the user's ingredients and counts how
+    often each recipe shows up. That reads one entry per recipe/pantry match,
+    never more than nnz(R), where a pass over the rows of R reads all of them.
+    """
+    n_recipes = data.R.shape[0]
+    ptr, postings = data.postings_ptr, data.postings
+    hits = [postings[ptr[j]:ptr[j + 1]] for j in user_ids]
+    if not hits:
+        return np.zeros(n_recipes, dtype=np.int32)
+    return np.bincount(np.concatenate(hits), minlength=n_recipes).astype(np.int32)
+
+
+def static_scores(recipe_sizes, ratings):
+    """
+    The part of every recipe's score that doesn't depend on the pantry,
+    computed once at load time: as if nothing matched, every ingredient is
+    missing (feature 2) and the rating bonus (feature 4) is fixed.
+    """
+    return (SCORE_WEIGHTS[1] * recipe_sizes + SCORE_WEIGHTS[3] * ratings).astype(np.float32)
+
+
+def final_scores(common, recipe_sizes, static):
+    """
+    Completes the precomputed static scores with the pantry-dependent terms.
+    Each matching ingredient earns its reward (feature 1) and refunds its
+    missing-ingredient penalty; the perfect-match bonus (feature 3) is added
+    when nothing is missing.
+    """
+    return (
+        static
+        + (SCORE_WEIGHTS[0] - SCORE_WEIGHTS[1]) * common
+        + SCORE_WEIGHTS[2] * (common == recipe_sizes)
+    )